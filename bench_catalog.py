@@ -0,0 +1,100 @@
+"""Memory benchmark: dict-of-dicts orders vs. the compact OrderCatalog.
+
+Usage: python bench_catalog.py [--orders 1000000]
+"""
+import argparse
+import gc
+import os
+import random
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+
+from catalog import OrderCatalog
+
+STATUSES = ["Shipped", "Processing", "Delivered", "Cancelled"]
+WIDGETS = ["Widget A", "Widget B", "Widget C", "Widget D", "Widget E"]
+
+
+def generate_orders(count: int, seed: int = 42):
+    rng = random.Random(seed)
+    items = [f"{a} x{n}, {b} x1" for a in WIDGETS for b in WIDGETS for n in range(1, 4)]
+    addresses = [f"{n} Main St, Springfield" for n in range(1000)]
+    for i in range(count):
+        yield (
+            f"SH{100000 + i}",
+            rng.choice(STATUSES),
+            f"Customer {i}",
+            rng.choice(items),
+            round(rng.uniform(5, 500), 2),
+            rng.choice(addresses),
+            f"2025-08-{rng.randint(1, 30):02d}",
+            f"1Z999AA{i:010d}" if rng.random() < 0.7 else None,
+        )
+
+
+def measure(label: str, build):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<28} {current / 2**20:9.1f} MiB held  {peak / 2**20:9.1f} MiB peak  {elapsed:6.2f}s")
+    return result
+
+
+def build_dicts(count: int):
+    fields = [name for name, _ in OrderCatalog.FIELDS]
+    return {row[0]: dict(zip(fields, row)) for row in generate_orders(count)}
+
+
+def build_catalog(count: int):
+    catalog = OrderCatalog()
+    for row in generate_orders(count):
+        catalog.add_row(row)
+    return catalog
+
+
+def write_snapshot(path: str, count: int):
+    con = sqlite3.connect(path)
+    con.execute("""
+    CREATE TABLE orders (
+        id TEXT PRIMARY KEY,
+        status TEXT,
+        customer_name TEXT,
+        items TEXT,
+        total_price REAL,
+        shipping_address TEXT,
+        created_at TEXT,
+        tracking_number TEXT
+    )
+    """)
+    con.executemany("INSERT INTO orders VALUES (?, ?, ?, ?, ?, ?, ?, ?)", generate_orders(count))
+    con.commit()
+    con.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    print(f"Orders: {args.orders:,}")
+    dicts = measure("dict of dicts", lambda: build_dicts(args.orders))
+    del dicts
+    catalog = measure("OrderCatalog", lambda: build_catalog(args.orders))
+    del catalog
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "orders.db")
+        write_snapshot(path, args.orders)
+        catalog = measure("OrderCatalog.from_sqlite", lambda: OrderCatalog.from_sqlite(path))
+        sample = f"SH{100000 + args.orders // 2}"
+        print(f"Lookup {sample}: {catalog.get(sample)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+import math
+import sqlite3
+from array import array
+from pathlib import Path
+
+# Stands in for NULL in integer columns (e.g. an unknown quantity)
+INT_NULL = -2 ** 63
+
+# --------------------------
+# Compact columnar catalogs
+# --------------------------
+# Orders and inventory are stored column by column instead of as one dict per
+# row. Numbers live in typed arrays, repeated strings (status, items, address)
+# are interned once in a StringPool and referenced by integer code, unique
+# text is packed into a single UTF-8 buffer, and a Record view is only
+# created when a single row is looked up. Ids are stored once, in the packed
+# id column, and found through an open-addressing hash table of row numbers.
+
+class StringPool:
+    """Stores each distinct string once and hands out integer codes for it."""
+    __slots__ = ("_codes", "_values")
+
+    def __init__(self):
+        # Code 0 is reserved for None
+        self._codes = {}
+        self._values = [None]
+
+    def code(self, value):
+        if value is None:
+            return 0
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self._values)
+            self._codes[value] = code
+            self._values.append(value)
+        return code
+
+    def value(self, code: int):
+        return self._values[code]
+
+    def __len__(self):
+        return len(self._values) - 1
+
+
+class _Column:
+    """A single catalog column: 'pooled' (interned string), 'text', 'float' or 'int'."""
+    __slots__ = ("kind", "data", "pool", "blob", "lengths")
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.pool = StringPool() if kind == "pooled" else None
+        self.blob = self.lengths = None
+        if kind == "pooled":
+            self.data = array("I")
+        elif kind == "float":
+            self.data = array("d")
+        elif kind == "int":
+            self.data = array("q")
+        else:
+            # Mostly-unique text is packed as UTF-8 into one buffer;
+            # data holds start offsets and a length of -1 means None
+            self.data = array("q")
+            self.lengths = array("i")
+            self.blob = bytearray()
+
+    def _encode(self, value):
+        if self.kind == "pooled":
+            return self.pool.code(value)
+        if self.kind == "float":
+            # NaN stands in for NULL prices
+            return math.nan if value is None else float(value)
+        if self.kind == "int":
+            return INT_NULL if value is None else int(value)
+        if value is None:
+            return 0, -1
+        encoded = str(value).encode("utf-8")
+        start = len(self.blob)
+        self.blob += encoded
+        return start, len(encoded)
+
+    def append(self, value):
+        if self.kind == "text":
+            start, length = self._encode(value)
+            self.data.append(start)
+            self.lengths.append(length)
+        else:
+            self.data.append(self._encode(value))
+
+    def set(self, row: int, value):
+        # Replaced text is appended to the buffer; the old bytes are left behind
+        if self.kind == "text":
+            self.data[row], self.lengths[row] = self._encode(value)
+        else:
+            self.data[row] = self._encode(value)
+
+    def equals(self, row: int, encoded: bytes) -> bool:
+        """Compare a packed text value with UTF-8 bytes without decoding it."""
+        length = self.lengths[row]
+        if length != len(encoded):
+            return False
+        start = self.data[row]
+        return self.blob[start:start + length] == encoded
+
+    def raw(self, row: int) -> bytes:
+        start = self.data[row]
+        return bytes(self.blob[start:start + self.lengths[row]])
+
+    def get(self, row: int):
+        stored = self.data[row]
+        if self.kind == "pooled":
+            return self.pool.value(stored)
+        if self.kind == "float":
+            return None if math.isnan(stored) else stored
+        if self.kind == "int":
+            return None if stored == INT_NULL else stored
+        length = self.lengths[row]
+        if length < 0:
+            return None
+        return self.blob[stored:stored + length].decode("utf-8")
+
+
+class Record:
+    """Read-only view of one catalog row that behaves like the old dict rows."""
+    __slots__ = ("_catalog", "_row")
+
+    def __init__(self, catalog, row: int):
+        self._catalog = catalog
+        self._row = row
+
+    def __getitem__(self, field: str):
+        return self._catalog._columns[field].get(self._row)
+
+    def get(self, field: str, default=None):
+        if field not in self._catalog._columns:
+            return default
+        return self[field]
+
+    def keys(self):
+        return self._catalog.field_names
+
+    def items(self):
+        return [(field, self[field]) for field in self.keys()]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __contains__(self, field):
+        return field in self._catalog._columns
+
+    def __len__(self):
+        return len(self._catalog.field_names)
+
+    def to_dict(self) -> dict:
+        return {field: self[field] for field in self.keys()}
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            return self.to_dict() == other.to_dict()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+
+class Catalog:
+    """Columnar id -> record store with the same get()/[] lookups as a dict.
+
+    Not safe to write while other threads read; fill it up front (mock data,
+    the startup SQLite snapshot) and treat it as read-only afterwards.
+    """
+    # (field name, column kind) pairs; the first field is the record id
+    FIELDS = ()
+    # SQLite table the catalog can be loaded from
+    TABLE = None
+
+    def __init__(self, records=()):
+        # Bumped every time a row is replaced, so cached copies can tell they're stale
+        self._versions = array("I")
+        self._columns = {name: _Column(kind) for name, kind in self.FIELDS}
+        self.field_names = tuple(name for name, _ in self.FIELDS)
+        self._ids = self._columns[self.field_names[0]]
+        # Hash table of row numbers (-1 = empty slot), kept at most half full
+        self._index = array("i", [-1]) * 8
+        for record in records:
+            self.add(record)
+
+    def add(self, record: dict, replace: bool = True):
+        """Insert or update a record given as a dict."""
+        self.add_row(tuple(record.get(name) for name in self.field_names), replace)
+
+    def add_row(self, values: tuple, replace: bool = True):
+        """Insert or update a record given as a tuple in FIELDS order."""
+        key = values[0].encode("utf-8")
+        slot, row = self._probe(key)
+        if row is None:
+            self._index[slot] = len(self._versions)
+            self._versions.append(0)
+            for column, value in zip(self._columns.values(), values):
+                column.append(value)
+            if len(self._versions) * 2 > len(self._index):
+                self._grow_index()
+        elif replace:
+            self._versions[row] += 1
+            # The id column already holds this key; rewriting it would only grow the buffer
+            for column, value in zip(list(self._columns.values())[1:], values[1:]):
+                column.set(row, value)
+
+    def _probe(self, key: bytes):
+        """Find the slot holding `key`, or the empty slot where it would go.
+
+        Returns (slot, row), with row None when the key isn't in the catalog.
+        """
+        mask = len(self._index) - 1
+        slot = hash(key) & mask
+        while True:
+            row = self._index[slot]
+            if row < 0:
+                return slot, None
+            if self._ids.equals(row, key):
+                return slot, row
+            slot = (slot + 1) & mask
+
+    def _grow_index(self):
+        self._index = array("i", [-1]) * (len(self._index) * 2)
+        mask = len(self._index) - 1
+        for row in range(len(self._versions)):
+            slot = hash(self._ids.raw(row)) & mask
+            while self._index[slot] >= 0:
+                slot = (slot + 1) & mask
+            self._index[slot] = row
+
+    def _row(self, record_id):
+        if not isinstance(record_id, str):
+            return None
+        return self._probe(record_id.encode("utf-8"))[1]
+
+    def load_sqlite(self, path: str, replace: bool = True, chunk_size: int = 10000,
+                    mmap_size: int = 256 * 1024 * 1024):
+        """Bulk load the catalog's table from a read-only, memory-mapped SQLite snapshot."""
+        uri = Path(path).resolve().as_uri() + "?mode=ro"
+        con = sqlite3.connect(uri, uri=True)
+        try:
+            con.execute(f"PRAGMA mmap_size = {int(mmap_size)}")
+            available = {row[1] for row in con.execute(f"PRAGMA table_info({self.TABLE})")}
+            if not available:
+                return self
+            # Columns the table doesn't have (e.g. tracking_number) load as NULL
+            select = ", ".join(name if name in available else "NULL" for name in self.field_names)
+            cur = con.execute(f"SELECT {select} FROM {self.TABLE}")
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for row in rows:
+                    self.add_row(row, replace)
+        finally:
+            con.close()
+        return self
+
+    @classmethod
+    def from_sqlite(cls, path: str, **kwargs):
+        return cls().load_sqlite(path, **kwargs)
+
+    def get(self, record_id: str, default=None):
+        row = self._row(record_id)
+        if row is None:
+            return default
+        return Record(self, row)
+
+    def version(self, record_id: str):
+        """Update counter of a record, or None if it isn't in the catalog."""
+        row = self._row(record_id)
+        if row is None:
+            return None
+        return self._versions[row]
+
+    def __getitem__(self, record_id: str) -> Record:
+        row = self._row(record_id)
+        if row is None:
+            raise KeyError(record_id)
+        return Record(self, row)
+
+    def __contains__(self, record_id):
+        return self._row(record_id) is not None
+
+    def __iter__(self):
+        return (self._ids.get(row) for row in range(len(self._versions)))
+
+    def __len__(self):
+        return len(self._versions)
+
+
+class OrderCatalog(Catalog):
+    FIELDS = (
+        ("id", "text"),
+        ("status", "pooled"),
+        ("customer_name", "text"),
+        ("items", "pooled"),
+        ("total_price", "float"),
+        ("shipping_address", "pooled"),
+        ("created_at", "pooled"),
+        ("tracking_number", "text"),
+    )
+    TABLE = "orders"
+
+
+class InventoryCatalog(Catalog):
+    FIELDS = (
+        ("id", "text"),
+        ("name", "pooled"),
+        ("quantity", "int"),
+        ("price", "float"),
+        ("sku", "text"),
+    )
+    TABLE = "inventory"
@@ -0,0 +1,93 @@
+import re
+
+# --------------------------
+# Pronoun detection
+# --------------------------
+# Pronouns that refer back to an order, ticket or product, per supported
+# language. English is always checked since users often mix it in.
+# Words that are mostly impersonal or part of fixed phrases are left out:
+# fr "il" (il y a, il faut), de "es" (es gibt), es/it "lo" (lo siento, articles).
+PRONOUNS = {
+    'en': frozenset({"it", "its"}),
+    'fr': frozenset({"elle"}),
+    'es': frozenset({"él", "ella"}),
+    'de': frozenset({"er", "ihn"}),
+    'it': frozenset({"esso", "essa"}),
+    'pt': frozenset({"ele", "ela"}),
+    'nl': frozenset({"hij", "zij"}),
+    'ru': frozenset({"он", "она", "оно", "его", "её"}),
+    'ar': frozenset({"هو", "هي"}),
+    'hi': frozenset({"यह", "वह"}),
+}
+
+# Languages written without spaces between words are matched by substring
+PRONOUN_SUBSTRINGS = {
+    'zh': ("它",),
+    'ja': ("それ",),
+    'ko': ("그것",),
+}
+
+_WORD = re.compile(r"\w+")
+
+
+def mentions_pronoun(text: str, lang: str = 'en') -> bool:
+    """True if the text contains a referring pronoun as a whole word."""
+    pronouns = PRONOUNS['en'] | PRONOUNS.get(lang, frozenset())
+    if not pronouns.isdisjoint(_WORD.findall(text.lower())):
+        return True
+    return any(pronoun in text for pronoun in PRONOUN_SUBSTRINGS.get(lang, ()))
+
+
+# --------------------------
+# Entity memory
+# --------------------------
+class Entity:
+    """A resolved order, ticket or product cached for follow-up questions.
+
+    `source` is anything with version(id) and get(id), such as a catalog.
+    The source's version is recorded with the cached copy, and the entity
+    is re-read only after that version changes.
+    """
+    __slots__ = ("kind", "id", "value", "version", "source")
+
+    def __init__(self, kind: str, entity_id: str, value=None, source=None):
+        self.kind = kind
+        self.id = entity_id
+        self.value = dict(value) if value is not None else None
+        self.source = source
+        self.version = source.version(entity_id) if source is not None else None
+
+    def refresh(self):
+        """Return the cached value, reloading it from the catalog if it changed."""
+        if self.source is not None:
+            current = self.source.version(self.id)
+            if current != self.version:
+                record = self.source.get(self.id)
+                self.value = dict(record) if record is not None else None
+                self.version = current
+        return self.value
+
+
+class EntityMemory:
+    """Entities mentioned in one conversation, most recent last."""
+    __slots__ = ("_entities",)
+
+    def __init__(self):
+        self._entities = {}
+
+    def remember(self, kind: str, entity_id: str, value=None, source=None) -> Entity:
+        # Re-inserting moves the kind to the end, marking it most recent
+        self._entities.pop(kind, None)
+        entity = Entity(kind, entity_id, value, source)
+        self._entities[kind] = entity
+        return entity
+
+    def get(self, kind: str):
+        return self._entities.get(kind)
+
+    def latest(self):
+        """The most recently mentioned entity, or None."""
+        return next(reversed(self._entities.values()), None)
+
+    def __bool__(self):
+        return bool(self._entities)
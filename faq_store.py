@@ -0,0 +1,213 @@
+"""FAQ storage, deduplication and bulk ingestion.
+
+Usage: python faq_store.py faqs.csv [more.jsonl ...] [--db faq.db] [--chunk-size 5000]
+
+CSV files need ``question`` and ``answer`` columns; JSONL files hold one
+``{"question": ..., "answer": ...}`` object per line.
+"""
+import argparse
+import csv
+import hashlib
+import json
+import re
+import sqlite3
+import time
+from itertools import islice
+
+# --------------------------
+# Normalization
+# --------------------------
+def normalize_question(question: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    return re.sub(r"\s+", " ", question.lower()).strip().rstrip("?!. ")
+
+
+def question_hash(question: str) -> str:
+    """Stable hash of the normalized question, used to deduplicate FAQs."""
+    return hashlib.sha1(normalize_question(question).encode("utf-8")).hexdigest()
+
+
+# --------------------------
+# Schema
+# --------------------------
+def ensure_faq_schema(con: sqlite3.Connection) -> bool:
+    """Create or migrate the faq table, its hash index and the keyword search index.
+
+    Returns whether the keyword search index (faq_fts) is available.
+    """
+    cur = con.cursor()
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS faq (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        question TEXT,
+        answer TEXT,
+        question_hash TEXT
+    )
+    """)
+
+    # One-time migration: older databases have no question_hash column and may
+    # hold duplicate rows. Keep the newest copy, matching the upsert's last write wins.
+    columns = {row[1] for row in cur.execute("PRAGMA table_info(faq)")}
+    if "question_hash" not in columns:
+        cur.execute("ALTER TABLE faq ADD COLUMN question_hash TEXT")
+        # Rows without a question can never match and can't be hashed
+        cur.execute("DELETE FROM faq WHERE question IS NULL")
+        con.create_function("question_hash", 1, question_hash, deterministic=True)
+        cur.execute("UPDATE faq SET question_hash = question_hash(question)")
+        cur.execute("DELETE FROM faq WHERE id NOT IN (SELECT MAX(id) FROM faq GROUP BY question_hash)")
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS faq_question_hash ON faq (question_hash)")
+
+    # Trigram full-text index so get_answer's substring keyword search doesn't
+    # scan the whole table; triggers keep it in sync with every upsert.
+    # The trigram tokenizer needs SQLite 3.34+; older versions go without it.
+    search_index = _ensure_search_index(cur)
+    con.commit()
+    return search_index
+
+
+def _ensure_search_index(cur) -> bool:
+    """Create the faq_fts index and its triggers; False if this SQLite can't use it."""
+    try:
+        has_index = cur.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'faq_fts'"
+        ).fetchone()
+        if not has_index:
+            cur.execute(
+                "CREATE VIRTUAL TABLE faq_fts USING fts5("
+                "question, content='faq', content_rowid='id', tokenize='trigram')"
+            )
+            cur.execute("INSERT INTO faq_fts (faq_fts) VALUES ('rebuild')")
+        cur.execute("SELECT 1 FROM faq_fts LIMIT 0")
+        has_triggers = cur.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'faq_fts_insert'"
+        ).fetchone()
+        if has_index and not has_triggers:
+            # Writes made while the index was unusable were never indexed
+            cur.execute("INSERT INTO faq_fts (faq_fts) VALUES ('rebuild')")
+    except sqlite3.OperationalError:
+        # Without a usable index the triggers would make every write fail
+        for trigger in ("faq_fts_insert", "faq_fts_delete", "faq_fts_update"):
+            cur.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        return False
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS faq_fts_insert AFTER INSERT ON faq BEGIN
+        INSERT INTO faq_fts (rowid, question) VALUES (new.id, new.question);
+    END
+    """)
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS faq_fts_delete AFTER DELETE ON faq BEGIN
+        INSERT INTO faq_fts (faq_fts, rowid, question) VALUES ('delete', old.id, old.question);
+    END
+    """)
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS faq_fts_update AFTER UPDATE OF question ON faq BEGIN
+        INSERT INTO faq_fts (faq_fts, rowid, question) VALUES ('delete', old.id, old.question);
+        INSERT INTO faq_fts (rowid, question) VALUES (new.id, new.question);
+    END
+    """)
+    return True
+
+
+# --------------------------
+# Upserts
+# --------------------------
+UPSERT_SQL = """
+INSERT INTO faq (question, answer, question_hash) VALUES (?, ?, ?)
+ON CONFLICT (question_hash) DO UPDATE SET
+    question = excluded.question,
+    answer = excluded.answer
+WHERE faq.question IS NOT excluded.question OR faq.answer IS NOT excluded.answer
+"""
+
+
+def upsert_faqs(con: sqlite3.Connection, faqs) -> int:
+    """Insert new FAQs and update changed ones in a single transaction.
+
+    Unchanged rows are left untouched, so the search index only sees real changes.
+    Returns the number of rows inserted or updated.
+    """
+    rows = [(question, answer, question_hash(question)) for question, answer in faqs]
+    with con:
+        cur = con.executemany(UPSERT_SQL, rows)
+    return cur.rowcount
+
+
+# --------------------------
+# Readers
+# --------------------------
+REQUIRED_COLUMNS = ("question", "answer")
+
+
+def read_csv(path: str):
+    # utf-8-sig drops the byte order mark Excel puts in front of the header
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        missing = [name for name in REQUIRED_COLUMNS if name not in (reader.fieldnames or ())]
+        if missing:
+            raise ValueError(f"{path}: missing required column(s) {', '.join(missing)}; found {reader.fieldnames}")
+        for row in reader:
+            yield row["question"], row["answer"]
+
+
+def read_jsonl(path: str):
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{line_number}: invalid JSON ({e})")
+            if not isinstance(entry, dict):
+                raise ValueError(f"{path}:{line_number}: expected a JSON object")
+            for name in REQUIRED_COLUMNS:
+                if entry.get(name) is not None and not isinstance(entry[name], str):
+                    raise ValueError(f"{path}:{line_number}: {name} must be a string")
+            yield entry.get("question"), entry.get("answer")
+
+
+def read_faqs(path: str):
+    """Stream (question, answer) pairs, skipping incomplete entries."""
+    reader = read_jsonl if path.endswith((".jsonl", ".ndjson")) else read_csv
+    for question, answer in reader(path):
+        if question and question.strip() and answer:
+            yield question.strip(), answer
+
+
+def ingest(con: sqlite3.Connection, faqs, chunk_size: int = 5000) -> dict:
+    """Upsert a stream of FAQs chunk by chunk so memory stays bounded."""
+    stats = {"read": 0, "changed": 0}
+    faqs = iter(faqs)
+    while True:
+        chunk = list(islice(faqs, chunk_size))
+        if not chunk:
+            break
+        stats["read"] += len(chunk)
+        stats["changed"] += upsert_faqs(con, chunk)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk load FAQs from CSV or JSONL files.")
+    parser.add_argument("files", nargs="+", help="CSV or JSONL files to ingest")
+    parser.add_argument("--db", default="faq.db")
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    con = sqlite3.connect(args.db)
+    con.execute("PRAGMA synchronous = NORMAL")
+    ensure_faq_schema(con)
+    for path in args.files:
+        start = time.perf_counter()
+        try:
+            stats = ingest(con, read_faqs(path), args.chunk_size)
+        except ValueError as e:
+            con.close()
+            parser.exit(1, f"Error: {e}\n")
+        elapsed = time.perf_counter() - start
+        print(f"{path}: {stats['read']} read, {stats['changed']} inserted or updated in {elapsed:.1f}s")
+    con.close()
+
+
+if __name__ == "__main__":
+    main()
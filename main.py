@@ -5,7 +5,11 @@ import collections
 import sqlite3
 import os
 import re
+import contextvars
+import hmac
+import threading
 from fastapi import FastAPI, Request, HTTPException
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from openai import OpenAI
 from dotenv import load_dotenv
@@ -16,9 +20,21 @@ import asyncio
 from mock_data import (
     MOCK_ORDERS,
     MOCK_INVENTORY,
+    MOCK_TICKETS,
     create_mock_ticket,
     mock_analytics
 )
+from entity_memory import EntityMemory, mentions_pronoun
+from faq_store import ensure_faq_schema, question_hash
+from observability import (
+    collapsed_stacks,
+    configure_logging,
+    logger,
+    profile_request,
+    sampled_thread,
+    sampler,
+    stage
+)
 from langdetect import detect
 from deep_translator import GoogleTranslator
 
@@ -28,13 +44,14 @@ analytics = {
 }
 
 app = FastAPI()
-user_context = defaultdict(dict)
+user_context = defaultdict(EntityMemory)
 
 # --------------------------
 # Real-world endpoints
 # --------------------------
 
 @app.post("/support_ticket")
+@sampled_thread
 async def support_ticket(request: Request):
     start_time = datetime.now()
     data = await request.json()
@@ -59,8 +76,9 @@ async def support_ticket(request: Request):
     }
 
 @app.get("/order/{order_id}")
+@sampled_thread
 async def get_order_details(order_id: str):
-    # Get order from mock data
+    # Get order from the order catalog
     order = MOCK_ORDERS.get(order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
@@ -72,11 +90,12 @@ async def get_order_details(order_id: str):
         resolved=True
     )
     
-    return order
+    return order.to_dict()
 
 @app.get("/inventory/{product_id}")
+@sampled_thread
 async def check_inventory(product_id: str):
-    # Get inventory from mock data
+    # Get inventory from the inventory catalog
     inventory = MOCK_INVENTORY.get(product_id)
     if not inventory:
         raise HTTPException(status_code=404, detail="Product not found")
@@ -88,14 +107,51 @@ async def check_inventory(product_id: str):
         resolved=True
     )
     
-    return inventory
+    return inventory.to_dict()
 
 @app.get("/metrics")
+@sampled_thread
 async def get_business_metrics():
     return mock_analytics.get_analytics()
 
+# --------------------------
+# Profiling admin endpoints
+# --------------------------
+def require_admin(request: Request):
+    # Disabled unless ADMIN_TOKEN is configured
+    token = os.getenv("ADMIN_TOKEN")
+    # Compare bytes: compare_digest rejects non-ASCII str arguments
+    supplied = request.headers.get("X-Admin-Token", "").encode()
+    if not token or not hmac.compare_digest(supplied, token.encode()):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+@app.get("/admin/profiles")
+@sampled_thread
+async def list_slow_profiles(request: Request):
+    require_admin(request)
+    return {
+        "threshold_ms": sampler.threshold_ms,
+        "profiles": [
+            {key: value for key, value in profile.items() if key != "samples"}
+            for profile in sampler.profiles
+        ]
+    }
+
+@app.get("/admin/profiles/{profile_id}")
+@sampled_thread
+async def download_slow_profile(profile_id: int, request: Request):
+    require_admin(request)
+    profile = sampler.get(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(
+        collapsed_stacks(profile),
+        headers={"Content-Disposition": f"attachment; filename=profile-{profile_id}.folded"}
+    )
+
 # Load environment variables (from .env file)
 load_dotenv()
+configure_logging()
 
 # Connect to OpenAI (if key available)
 client = None
@@ -112,8 +168,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
+# Opt-in stage timings (X-Profile: 1 or ?profile=1) and slow-request sampling (PROFILE_SLOW_MS)
+app.middleware("http")(profile_request)
+
 # --------------------------
 # Database setup
 # --------------------------
@@ -144,9 +204,18 @@ def setup_database():
         ]
         cur.executemany("INSERT INTO orders (id, status, customer_name, items, total_price, shipping_address, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)", orders)
     con.commit()
+
+    # FAQ table, question hash index and keyword search index
+    search_index = ensure_faq_schema(con)
     con.close()
+    return search_index
 
-setup_database()  # Initialize database tables
+# Initialize database tables; without the trigram index (SQLite < 3.34)
+# get_answer falls back to scanning with LIKE
+FAQ_SEARCH_INDEX = setup_database()
+
+# Bulk load the orders table into the compact order catalog (mock orders win)
+MOCK_ORDERS.load_sqlite("faq.db", replace=False)
 
 
 # --------------------------
@@ -156,31 +225,33 @@ def get_answer(user_question: str):
     con = sqlite3.connect("faq.db")
     cur = con.cursor()
 
-    # Case-insensitive direct match (exact question)
+    # Direct match on the normalized question hash (exact question)
     row = cur.execute(
-        "SELECT answer FROM faq WHERE LOWER(question) = ?",
-        (user_question.lower(),)
+        "SELECT answer FROM faq WHERE question_hash = ?",
+        (question_hash(user_question),)
     ).fetchone()
     if row:
-        print("FAQ exact match found.")
+        logger.info("FAQ exact match found.")
         con.close()
         return row[0]
 
     # Keyword detection: match only if at least 2 keywords are found
     keywords = [w for w in user_question.lower().split() if len(w) > 3]
     matches = []
+    if FAQ_SEARCH_INDEX:
+        # Trigram index answers the substring LIKE without a table scan
+        keyword_sql = "SELECT faq.answer FROM faq_fts JOIN faq ON faq.id = faq_fts.rowid WHERE faq_fts.question LIKE ? LIMIT 1"
+    else:
+        keyword_sql = "SELECT answer FROM faq WHERE LOWER(question) LIKE ?"
     for kw in keywords:
-        row = cur.execute(
-            "SELECT answer FROM faq WHERE LOWER(question) LIKE ?",
-            ('%' + kw + '%',)
-        ).fetchone()
+        row = cur.execute(keyword_sql, ('%' + kw + '%',)).fetchone()
         if row:
             matches.append(row[0])
     con.close()
     if len(matches) >= 2:
-        print(f"FAQ keyword match found for keywords: {keywords}")
+        logger.info("FAQ keyword match found for keywords: %s", keywords)
         return matches[0]
-    print("No FAQ match found.")
+    logger.info("No FAQ match found.")
     return None  # return None if not found
 
 
@@ -206,6 +277,85 @@ def track_order(order_id: str):
     return None
 
 
+def lookup_order(order_id: str):
+    """Order from the in-memory catalog, falling back to SQLite for orders added after the snapshot."""
+    order_details = MOCK_ORDERS.get(order_id)
+    if not order_details:
+        order_details = track_order(order_id)
+    return order_details
+
+
+# Dedicated connection used only to watch faq.db for commits; PRAGMA data_version
+# changes whenever another connection commits, without reading any table
+_db_watch = sqlite3.connect("faq.db", check_same_thread=False)
+_db_watch_lock = threading.Lock()
+
+def faq_db_version() -> int:
+    with _db_watch_lock:
+        return _db_watch.execute("PRAGMA data_version").fetchone()[0]
+
+
+class OrderSource:
+    """Where remembered orders are re-read from when they change.
+
+    The version combines the catalog row's update counter with faq.db's data
+    version, so an order cached in the entity memory is re-read after a
+    catalog replace or after any commit to the orders table.
+    """
+
+    def version(self, order_id: str):
+        return MOCK_ORDERS.version(order_id), faq_db_version()
+
+    def get(self, order_id: str):
+        return lookup_order(order_id)
+
+
+order_source = OrderSource()
+
+
+def format_order_details(order_id: str, order_details) -> str:
+    # English response format
+    order_response = f"Here are the details for order {order_id}:\n"
+    order_response += f"Status: {order_details['status']}\n"
+    order_response += f"Items: {order_details['items']}\n"
+    order_response += f"Total: ${order_details['total_price']:.2f}\n"
+    order_response += f"Shipping to: {order_details['shipping_address']}\n"
+    if order_details.get('tracking_number'):
+        order_response += f"Tracking Number: {order_details['tracking_number']}"
+    return order_response
+
+
+def format_ticket_details(ticket_id: str, ticket) -> str:
+    return f"Ticket {ticket_id}: Status: {ticket['status']}. Issue: {ticket['issue']}"
+
+
+def format_product_details(product_id: str, product) -> str:
+    quantity = product.get('quantity')
+    if quantity is None:
+        stock = "Stock level unknown"
+    elif quantity > 0:
+        stock = f"{quantity} in stock"
+    else:
+        stock = "Out of stock"
+    return f"Product {product_id} ({product['name']}): {stock}."
+
+
+def describe_entity(entity):
+    """English answer for a follow-up about a remembered entity, or None if it's gone."""
+    value = entity.refresh()
+    if entity.kind == "order":
+        if not value:
+            return None
+        return f"{format_order_details(entity.id, value).rstrip()}\n(referring to your last order {entity.id})"
+    if entity.kind == "ticket":
+        if not value:
+            return None
+        return f"{format_ticket_details(entity.id, value)} (referring to your last ticket {entity.id})"
+    if not value:
+        return None
+    return f"{format_product_details(entity.id, value)} (referring to your last product {entity.id})"
+
+
 # --------------------------
 # AI fallback
 # --------------------------
@@ -213,30 +363,31 @@ def ask_ai(prompt: str, original_lang: str = 'en'):
     # 1. Try OpenAI if key is available
     if client:
         try:
-            print("Using OpenAI for response.")
+            logger.info("Using OpenAI for response.")
             # Always ask in English for consistent responses
             eng_prompt = prompt if original_lang == 'en' else translate_text(prompt, 'en')
             
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a helpful customer support assistant."},
-                    {"role": "user", "content": eng_prompt}
-                ]
-            )
+            with stage("openai"):
+                response = client.chat.completions.create(
+                    model="gpt-3.5-turbo",
+                    messages=[
+                        {"role": "system", "content": "You are a helpful customer support assistant."},
+                        {"role": "user", "content": eng_prompt}
+                    ]
+                )
             response_text = response.choices[0].message.content
             
             # Translate response back to original language if needed
             if original_lang != 'en':
-                print(f"Translating response to {original_lang}")
+                logger.debug("Translating response to %s", original_lang)
                 response_text = translate_text(response_text, original_lang)
             return response_text
         except Exception as e:
-            print(f"⚠️ OpenAI error: {e}")
+            logger.warning("OpenAI error: %s", e)
 
     # 2. Simple fallback response
     try:
-        print("Using default fallback response.")
+        logger.info("Using default fallback response.")
         default_response = "I'm here to help! You can ask me about order tracking, inventory, return policies, or request to speak with a human."
         return translate_text(default_response, original_lang) if original_lang != 'en' else default_response
     except Exception as e:
@@ -245,6 +396,7 @@ def ask_ai(prompt: str, original_lang: str = 'en'):
 
 
 @app.get("/")
+@sampled_thread
 def home():
     # Show analytics summary on home endpoint
     top_faqs = analytics["faq_hits"].most_common(5)
@@ -282,24 +434,27 @@ def translate_text(text: str, target_lang: str = 'en') -> str:
         return text
     
     try:
-        translator = GoogleTranslator(source='auto', target=target_lang)
-        translated = translator.translate(text)
-        print(f"Translated '{text}' to {target_lang}: '{translated}'")
+        with stage("translate"):
+            translator = GoogleTranslator(source='auto', target=target_lang)
+            translated = translator.translate(text)
+        logger.debug("Translated %r to %s: %r", text, target_lang, translated)
         return translated
     except Exception as e:
-        print(f"Translation error: {e}")
+        logger.warning("Translation error: %s", e)
         return text
 
 def detect_language(text: str) -> str:
     """Detect the language of the input text."""
     try:
-        detected = detect(text)
+        with stage("detect_language"):
+            detected = detect(text)
         # If detected language is supported, use it; otherwise fall back to English
         return detected if detected in SUPPORTED_LANGUAGES else 'en'
     except:
         return 'en'
 
 @app.get("/ask")
+@sampled_thread
 def ask(question: str, user_id: str = "default", target_lang: str = None):
     # Use target_lang if provided, otherwise default to English
     # Don't auto-detect language to avoid unwanted translations
@@ -307,18 +462,19 @@ def ask(question: str, user_id: str = "default", target_lang: str = None):
         target_lang = 'en'
     
     original_question = question
-    print(f"Question: {question}, Target language: {target_lang}")
+    logger.info("Question: %r, Target language: %s", question, target_lang)
     
     # First check FAQ database
-    faq_answer = get_answer(question)
+    with stage("faq"):
+        faq_answer = get_answer(question)
     if faq_answer:
-        print("FAQ answer found, returning...")
+        logger.info("FAQ answer found, returning...")
         # Only translate if target_lang is not English
         if target_lang != 'en':
             faq_answer = translate_text(faq_answer, target_lang)
-            print(f"Translating FAQ to requested language: {target_lang}")
+            logger.debug("Translating FAQ to requested language: %s", target_lang)
         else:
-            print("Keeping FAQ response in English")
+            logger.debug("Keeping FAQ response in English")
         return {
             "question": original_question,
             "answer": faq_answer,
@@ -343,13 +499,37 @@ def ask(question: str, user_id: str = "default", target_lang: str = None):
     ]
     for phrase in handoff_phrases:
         if phrase in q:
-            print(f"Handoff triggered for phrase: {phrase}")
+            logger.info("Handoff triggered for phrase: %s", phrase)
             response = {
                 "question": question,
                 "answer": "I'm unable to assist further. Please provide your email and issue so we can connect you to a human agent.",
                 "handoff": True
             }
             return response
+    # --- Follow-ups about a remembered order/ticket/product ---
+    # Served from the conversation's entity memory, without a database round trip.
+    # Checked before the custom responses, whose substring keys (e.g. "hi" in
+    # "shipped") would otherwise catch questions like "has it shipped yet?"
+    has_entity_id = re.search(r"(SH\d+|TICK\d+|PROD\d+)", question.upper())
+    pronoun_used = not has_entity_id and mentions_pronoun(question, target_lang)
+    memory = user_context[user_id]
+    if pronoun_used and memory:
+        entity = memory.latest()
+        with stage("entity_memory"):
+            answer = describe_entity(entity)
+        if answer:
+            logger.info("Contextual memory used for pronoun, refers to %s %s.", entity.kind, entity.id)
+            if target_lang != 'en':
+                answer = translate_text(answer, target_lang)
+            response = {
+                "question": original_question,
+                "answer": answer,
+                "detected_language": target_lang
+            }
+            if entity.kind == "order":
+                response["order"] = entity.value
+            return response
+
     # 1. Custom professional responses (partial match)
     custom_responses = {
         # Greetings in different languages
@@ -397,13 +577,13 @@ def ask(question: str, user_id: str = "default", target_lang: str = None):
     # Get the appropriate response and translate if needed
     for key, response in custom_responses.items():
         if key.lower() in q.lower():
-            print(f"Custom response matched for key: {key}")
+            logger.info("Custom response matched for key: %s", key)
             # Only translate if target_lang is not English
             if target_lang != 'en':
                 translated_response = translate_text(response, target_lang)
-                print(f"Translating to requested language {target_lang}: {translated_response}")
+                logger.debug("Translating to requested language %s: %r", target_lang, translated_response)
                 return {"question": original_question, "answer": translated_response, "detected_language": target_lang}
-            print("Keeping response in English")
+            logger.debug("Keeping response in English")
             return {"question": original_question, "answer": response, "detected_language": "en"}
 
     # --- Order tracking ---
@@ -444,36 +624,25 @@ def ask(question: str, user_id: str = "default", target_lang: str = None):
     if order_match:
         try:
             order_id = order_match.group(1)
-            user_context[user_id]['last_order'] = order_id
             
-            # Try getting order from mock data first
-            from mock_data import MOCK_ORDERS
-            order_details = MOCK_ORDERS.get(order_id)
-            
-            # Fallback to database if not in mock data
-            if not order_details:
-                order_details = track_order(order_id)
+            with stage("order_lookup"):
+                order_details = lookup_order(order_id)
                 
             if order_details:
-                print(f"Order tracking found for {order_id}")
-                # English response format
-                order_response = f"Here are the details for order {order_id}:\n"
-                order_response += f"Status: {order_details['status']}\n"
-                order_response += f"Items: {order_details['items']}\n"
-                order_response += f"Total: ${order_details['total_price']:.2f}\n"
-                order_response += f"Shipping to: {order_details['shipping_address']}\n"
-                if order_details.get('tracking_number'):
-                    order_response += f"Tracking Number: {order_details['tracking_number']}"
+                logger.info("Order tracking found for %s", order_id)
+                # The conversation keeps its own copy; follow-ups re-read it only after a change
+                user_context[user_id].remember("order", order_id, order_details, source=order_source)
+                order_response = format_order_details(order_id, order_details)
                 
                 # Only translate if target language is not English
                 if target_lang != 'en':
-                    print(f"Translating English response to target language: {target_lang}")
+                    logger.debug("Translating English response to target language: %s", target_lang)
                     order_response = translate_text(order_response, target_lang)
                 
                 return {
                     "question": original_question,
                     "answer": order_response,
-                    "order": order_details,
+                    "order": dict(order_details),
                     "detected_language": target_lang
                 }
             else:
@@ -486,90 +655,66 @@ def ask(question: str, user_id: str = "default", target_lang: str = None):
                     "detected_language": target_lang
                 }
         except Exception as e:
-            print(f"Error tracking order: {e}")
+            logger.exception("Error tracking order: %s", e)
             return {"question": question, "answer": "Sorry, there was an error retrieving your order information. Please try again."}
 
     # --- Ticket tracking ---
-    ticket_match = re.search(r"(TICKET\d+)", question.upper())
+    # Ticket ids are issued by create_mock_ticket as TICK<number>
+    ticket_match = re.search(r"(TICK\d+)", question.upper())
     if ticket_match:
         ticket_id = ticket_match.group(1)
-        user_context[user_id]['last_ticket'] = ticket_id
-        # Here you would call a function to get ticket info
-        ticket_info = f"Ticket {ticket_id}: Your ticket is being processed."  # Placeholder
-        print(f"Ticket tracking found for {ticket_id}.")
-        return {"question": question, "answer": ticket_info}
+        ticket = MOCK_TICKETS.get(ticket_id)
+        if not ticket:
+            answer = f"Sorry, I couldn't find any information for ticket {ticket_id}. Please check if the ticket number is correct."
+            return {"question": question, "answer": answer}
+        # Tickets never change after creation, so the cached copy can't go stale
+        user_context[user_id].remember("ticket", ticket_id, ticket)
+        logger.info("Ticket tracking found for %s.", ticket_id)
+        return {"question": question, "answer": format_ticket_details(ticket_id, ticket)}
 
     # --- Product tracking ---
     product_match = re.search(r"(PROD\d+)", question.upper())
     if product_match:
         product_id = product_match.group(1)
-        user_context[user_id]['last_product'] = product_id
+        user_context[user_id].remember("product", product_id, MOCK_INVENTORY.get(product_id), source=MOCK_INVENTORY)
         # Here you would call a function to get product info
         product_info = f"Product {product_id}: This product is in stock."  # Placeholder
-        print(f"Product tracking found for {product_id}.")
+        logger.info("Product tracking found for %s.", product_id)
         return {"question": question, "answer": product_info}
 
-    # --- Contextual pronoun resolution ---
-    if "it" in question.lower():
-        found = False
-        if 'last_order' in user_context[user_id]:
-            order_id = user_context[user_id]['last_order']
-            order_status = track_order(order_id)
-            if order_status:
-                print(f"Contextual memory used for pronoun 'it', refers to {order_id}.")
-                answer = f"{order_status} (referring to your last order {order_id})"
-                return {"question": question, "answer": answer}
-            found = True
-        if 'last_ticket' in user_context[user_id]:
-            ticket_id = user_context[user_id]['last_ticket']
-            ticket_info = f"Ticket {ticket_id}: Your ticket is being processed."  # Placeholder
-            print(f"Contextual memory used for pronoun 'it', refers to {ticket_id}.")
-            answer = f"{ticket_info} (referring to your last ticket {ticket_id})"
-            return {"question": question, "answer": answer}
-            found = True
-        if 'last_product' in user_context[user_id]:
-            product_id = user_context[user_id]['last_product']
-            product_info = f"Product {product_id}: This product is in stock."  # Placeholder
-            print(f"Contextual memory used for pronoun 'it', refers to {product_id}.")
-            answer = f"{product_info} (referring to your last product {product_id})"
-            return {"question": question, "answer": answer}
-            found = True
-        if not found:
-            print("Contextual pronoun 'it' used, but no entity found in memory.")
-            answer = "Sorry, I couldn't find what 'it' refers to in our recent conversation."
-            return {"question": question, "answer": answer}
+    # A pronoun with nothing remembered (or nothing found) goes to the AI with the rest
     # Ensure every response has 'question' and 'answer'
     # If no answer found, fallback to AI or default message
-    import threading
     result = {"value": None}
     def ai_call():
         try:
-            print("Calling AI fallback...")
+            logger.info("Calling AI fallback...")
             # Use target_lang for AI response
             if target_lang != 'en':
                 result["value"] = ask_ai(question, target_lang)
             else:
                 result["value"] = ask_ai(question, 'en')
         except Exception as e:
-            print(f"AI call error: {e}")
+            logger.exception("AI call error: %s", e)
             error_msg = "Sorry, there was an error with the AI response."
             # Translate error message if needed
             if target_lang != 'en':
                 result["value"] = translate_text(error_msg, target_lang)
             else:
                 result["value"] = error_msg
-    t = threading.Thread(target=ai_call)
+    # Run in a copy of the request context so stage timings reach the profile
+    t = threading.Thread(target=contextvars.copy_context().run, args=(ai_call,))
     t.start()
     t.join(timeout=8)  # 8 seconds timeout
     if t.is_alive():
-        print("AI call timed out.")
+        logger.warning("AI call timed out.")
         response = {
             "question": original_question,
             "answer": "Sorry, the bot is taking too long to reply. Please try again.",
             "detected_language": target_lang
         }
         return response
-    print(f"AI response: {result['value']}")
+    logger.debug("AI response: %r", result['value'])
     answer = result["value"] or "Sorry, I don't have an answer for that."
     
     # Translate answer if target language is not English
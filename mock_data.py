@@ -1,9 +1,11 @@
 from datetime import datetime, timedelta
 import random
 
+from catalog import OrderCatalog, InventoryCatalog
+
 # Mock Orders Data
-MOCK_ORDERS = {
-    "SH123": {
+MOCK_ORDERS = OrderCatalog([
+    {
         "id": "SH123",
         "status": "Shipped",
         "customer_name": "Alice Smith",
@@ -13,7 +15,7 @@ MOCK_ORDERS = {
         "created_at": (datetime.now() - timedelta(days=3)).strftime("%Y-%m-%d"),
         "tracking_number": "1Z999AA1234567890"
     },
-    "SH124": {
+    {
         "id": "SH124",
         "status": "Processing",
         "customer_name": "Bob Johnson",
@@ -23,7 +25,7 @@ MOCK_ORDERS = {
         "created_at": (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d"),
         "tracking_number": None
     },
-    "SH125": {
+    {
         "id": "SH125",
         "status": "Delivered",
         "customer_name": "Carol Lee",
@@ -33,32 +35,32 @@ MOCK_ORDERS = {
         "created_at": (datetime.now() - timedelta(days=5)).strftime("%Y-%m-%d"),
         "tracking_number": "1Z999AA1234567891"
     }
-}
+])
 
 # Mock Inventory Data
-MOCK_INVENTORY = {
-    "PROD001": {
+MOCK_INVENTORY = InventoryCatalog([
+    {
         "id": "PROD001",
         "name": "Widget A",
         "quantity": 45,
         "price": 24.99,
         "sku": "WA-001"
     },
-    "PROD002": {
+    {
         "id": "PROD002",
         "name": "Widget B",
         "quantity": 8,
         "price": 19.99,
         "sku": "WB-002"
     },
-    "PROD003": {
+    {
         "id": "PROD003",
         "name": "Widget C",
         "quantity": 15,
         "price": 34.99,
         "sku": "WC-003"
     }
-}
+])
 
 # Mock Support Tickets
 MOCK_TICKETS = {}
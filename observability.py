@@ -0,0 +1,289 @@
+import asyncio
+import collections
+import contextvars
+import functools
+import itertools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# --------------------------
+# Structured logging
+# --------------------------
+# Log calls use lazy %-style arguments, so a disabled level costs one
+# isEnabledFor check and nothing is formatted.
+logger = logging.getLogger("chatbot")
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per log line."""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class RequestIdFilter(logging.Filter):
+    """Tags records with the id of the request being profiled, if any."""
+
+    def filter(self, record):
+        profile = _current_profile.get()
+        record.request_id = profile.id if profile else None
+        return True
+
+
+def configure_logging():
+    """Set up the chatbot logger from LOG_LEVEL (default WARNING) and LOG_FORMAT (json or text)."""
+    handler = logging.StreamHandler()
+    if os.getenv("LOG_FORMAT", "json").lower() == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+    handler.addFilter(RequestIdFilter())
+    logger.handlers = [handler]
+    logger.setLevel(os.getenv("LOG_LEVEL", "WARNING").upper())
+    logger.propagate = False
+
+
+# --------------------------
+# Request profiling
+# --------------------------
+class RequestProfile:
+    """Stage timings and stack samples collected for a single request."""
+    __slots__ = ("id", "method", "path", "started_at", "stages", "threads", "samples", "finished")
+
+    _ids = itertools.count(1)
+
+    def __init__(self, method: str, path: str):
+        self.id = next(self._ids)
+        self.method = method
+        self.path = path
+        self.started_at = datetime.now().isoformat(timespec="seconds")
+        self.stages = collections.defaultdict(float)
+        # Thread id -> anchor frame. With an anchor, a sample only counts when
+        # that frame is on the thread's stack (the shared event-loop thread)
+        self.threads = {}
+        self.samples = collections.Counter()
+        # Set once the response is on its way; work still running in a copied
+        # context (e.g. a timed-out AI thread) stops recording after that
+        self.finished = False
+
+    def server_timing(self, duration: float) -> str:
+        """Format the stage breakdown as a Server-Timing header value."""
+        # Snapshot first: other threads may still be adding stages
+        parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in dict(self.stages).items()]
+        parts.append(f"total;dur={duration * 1000:.1f}")
+        return ", ".join(parts)
+
+    def to_dict(self, duration: float) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "started_at": self.started_at,
+            "duration_ms": round(duration * 1000, 1),
+            "stages_ms": {name: round(seconds * 1000, 1) for name, seconds in dict(self.stages).items()},
+            "samples": dict(self.samples),
+        }
+
+
+_current_profile = contextvars.ContextVar("request_profile", default=None)
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block of work (SQLite, langdetect, translation, OpenAI...) for the current request.
+
+    Outside a profiled request this only does a context variable lookup.
+    """
+    profile = _current_profile.get()
+    if profile is None or profile.finished:
+        yield
+        return
+    # Threads started for the request (e.g. the AI call) register here
+    profile.threads.setdefault(threading.get_ident(), None)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if not profile.finished:
+            profile.stages[name] += time.perf_counter() - start
+
+
+def _on_stack(frame, anchor) -> bool:
+    while frame is not None:
+        if frame is anchor:
+            return True
+        frame = frame.f_back
+    return False
+
+
+def _collapse_stack(frame) -> str:
+    """Render a frame as a root-first 'file:function:line;...' collapsed stack."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class SlowRequestSampler:
+    """Statistical profiler that keeps stack samples of slow requests in a ring buffer.
+
+    While requests are in flight a background thread samples the stacks of
+    their worker threads every `interval` seconds. When a request finishes
+    its samples are kept only if it took at least `threshold_ms`.
+    """
+
+    def __init__(self, threshold_ms: float, interval: float, size: int):
+        self.threshold_ms = threshold_ms
+        self.interval = interval
+        self.profiles = collections.deque(maxlen=size)
+        self._active = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold_ms > 0
+
+    def start_request(self, profile: RequestProfile):
+        with self._lock:
+            self._active.add(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="slow-request-sampler", daemon=True)
+                self._thread.start()
+            self._wake.set()
+
+    def finish_request(self, profile: RequestProfile, duration: float):
+        with self._lock:
+            self._active.discard(profile)
+        if duration * 1000 >= self.threshold_ms:
+            self.profiles.append(profile.to_dict(duration))
+            logger.warning("Slow request %s %s took %.0f ms (profile %d)",
+                           profile.method, profile.path, duration * 1000, profile.id)
+
+    def get(self, profile_id: int):
+        for profile in self.profiles:
+            if profile["id"] == profile_id:
+                return profile
+        return None
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            with self._lock:
+                active = list(self._active)
+                if not active:
+                    self._wake.clear()
+                    continue
+            frames = sys._current_frames()
+            for profile in active:
+                if profile.finished:
+                    continue
+                for thread_id, anchor in list(profile.threads.items()):
+                    frame = frames.get(thread_id)
+                    if frame is None:
+                        continue
+                    # Skip the event loop while it runs other requests or sits idle
+                    if anchor is not None and not _on_stack(frame, anchor):
+                        continue
+                    profile.samples[_collapse_stack(frame)] += 1
+            del frames
+            time.sleep(self.interval)
+
+
+sampler = SlowRequestSampler(
+    threshold_ms=float(os.getenv("PROFILE_SLOW_MS", "0")),
+    interval=float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5")) / 1000,
+    size=int(os.getenv("PROFILE_BUFFER_SIZE", "20")),
+)
+
+
+def sampled_thread(endpoint):
+    """Decorator for endpoints: registers the thread running the handler for sampling.
+
+    Endpoints without it are timed but get no stack samples. Sync handlers
+    own their worker thread while they run. Async handlers share the event
+    loop, so their samples are kept only while the handler's own frame is
+    on the loop's stack.
+    """
+    if asyncio.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def async_wrapper(*args, **kwargs):
+            profile = _current_profile.get()
+            if profile is None:
+                return await endpoint(*args, **kwargs)
+            thread_id = threading.get_ident()
+            profile.threads[thread_id] = sys._getframe()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                profile.threads.pop(thread_id, None)
+        return async_wrapper
+
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        profile = _current_profile.get()
+        if profile is None:
+            return endpoint(*args, **kwargs)
+        thread_id = threading.get_ident()
+        profile.threads[thread_id] = None
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            # The pool thread moves on to other requests after this
+            profile.threads.pop(thread_id, None)
+    return wrapper
+
+
+def wants_breakdown(request) -> bool:
+    """Per-request opt-in via the X-Profile header or ?profile=1."""
+    return request.headers.get("x-profile") == "1" or request.query_params.get("profile") == "1"
+
+
+async def profile_request(request, call_next):
+    """HTTP middleware: time stages, add Server-Timing when asked, sample slow requests."""
+    breakdown = wants_breakdown(request)
+    if not breakdown and not sampler.enabled:
+        return await call_next(request)
+
+    profile = RequestProfile(request.method, request.url.path)
+    token = _current_profile.set(profile)
+    if sampler.enabled:
+        # Handler threads register themselves via @sampled_thread
+        sampler.start_request(profile)
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        duration = time.perf_counter() - start
+        profile.finished = True
+        # Log while the context still carries the profile, so records get its request_id
+        if sampler.enabled:
+            sampler.finish_request(profile, duration)
+        _current_profile.reset(token)
+    if breakdown:
+        response.headers["Server-Timing"] = profile.server_timing(duration)
+    return response
+
+
+def collapsed_stacks(profile: dict) -> str:
+    """Samples in collapsed-stack format (flamegraph.pl / speedscope)."""
+    return "".join(f"{stack} {count}\n" for stack, count in profile["samples"].items())
@@ -1,15 +1,9 @@
 import sqlite3
 
-con = sqlite3.connect("faq.db")
-cur = con.cursor()
+from faq_store import ensure_faq_schema, upsert_faqs
 
-cur.execute("""
-CREATE TABLE IF NOT EXISTS faq (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    question TEXT,
-    answer TEXT
-)
-""")
+con = sqlite3.connect("faq.db")
+ensure_faq_schema(con)
 
 faqs = [
     ("What is your return policy?", "You can return items within 30 days."),
@@ -17,8 +11,8 @@ faqs = [
     ("Do you ship internationally?", "Yes, we ship to most countries worldwide."),
 ]
 
-cur.executemany("INSERT INTO faq (question, answer) VALUES (?, ?)", faqs)
+# Upsert by question hash so re-running doesn't duplicate the seed FAQs
+upsert_faqs(con, faqs)
 
-con.commit()
 con.close()
 print("Database setup complete ✅")